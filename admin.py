@@ -2,61 +2,93 @@ from handin240_utils.utils import *
 
 import subprocess as sp
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper bound on concurrent workers for the per-student loops; keeps us from
+# swamping the AFS server (or VCS licenses) with hundreds of students
+MAX_WORKERS = 32
+
+# Default AFS permissions for a handin dir, without the specific student
+DEFAULT_PERMS = [
+    # Permissions for staff
+    "ee240:ta", "rlidwka",
+    "ee240:staff", "rlidwka",
+    "ee240", "rlidwka",
+    # Permissions for admins
+    "system:administrators", "rlidwk"
+]
 
 # Sets AFS permissions such that the student may write to the directory
 # Admins have usual admin permissions, and other students may not access
 def openStudentPerms(studentID, path, dryrun=False, verbose=False):
-    failedOnce = False
-    # Initially, clear permissions and add "default" perms
-    fsCmd = ["fs", "sa", path, "-clear", "-acl"]
-    # These are the default permissions, without the specific student
-    defaultPerms = [
-        # Permissions for staff
-        "ee240:ta", "rlidwka",
-        "ee240:staff", "rlidwka",
-        "ee240", "rlidwka",
-        # Permissions for admins
-        "system:administrators", "rlidwk"
-    ]
-    fsCmd += defaultPerms
+    return setStudentPerms(studentID, path, "write", dryrun, verbose)
 
+# Sets AFS permissions such that the student may no longer write to the directory
+def closeStudentPerms(studentID, path, dryrun=False):
+    return setStudentPerms(studentID, path, "read", dryrun)
+
+# Clears the ACL, then grants the default staff/admin perms and the given
+# rights for both of the student's principals. fs accepts multiple
+# "user rights" pairs per invocation, so the common (successful) case costs a
+# single fork+exec instead of three. Returns None on success, or studentID if
+# neither of the student's principals could be granted rights.
+def setStudentPerms(studentID, path, rights, dryrun=False, verbose=False):
     retVal = None
-    devnull = open(os.devnull, 'w')
-
-    try:
-        if (verbose):
-            print(' '.join(fsCmd))
-        if (not dryrun):
-            sp.check_call(fsCmd, stderr=devnull)
-    except sp.CalledProcessError as e:
-        print("Unable to set default perms for {}: {}".format(path, e))
+    # Email auth is necessary after creds merge, so grant both principals
+    principals = [studentID, studentID + "@andrew.cmu.edu"]
+    studentPerms = []
+    for principal in principals:
+        studentPerms += [principal, rights]
+    fsCmd = ["fs", "sa", path, "-clear", "-acl"] + DEFAULT_PERMS + studentPerms
+
+    if (verbose):
+        print(' '.join(fsCmd))
+    if (dryrun):
         return retVal
+    # stdin=DEVNULL/close_fds=False let subprocess use posix_spawn instead
+    # of fork + an FD-close walk. Failure is an expected outcome here (bad
+    # student ids), so branch on the returncode rather than paying for a
+    # raised CalledProcessError
+    batched = sp.run(fsCmd, stdin=sp.DEVNULL, stdout=sp.PIPE,
+                     stderr=sp.STDOUT, close_fds=False)
+    if (batched.returncode == 0):
+        return retVal
+    errOutput = batched.stdout.decode('utf-8')
 
-    fsCmd = ["fs", "sa", path, studentID, "write"]
-    try:
-        if (verbose):
-            print(' '.join(fsCmd))
-        if (not dryrun):
-            sp.check_call(fsCmd, stderr=devnull)
-        retVal = None
-    except sp.CalledProcessError as e:
-        failedOnce = True
-
-    # Email auth is necessary after creds merge
-    fsCmd = ["fs", "sa", path, studentID + "@andrew.cmu.edu", "write"]
-    try:
-        if (verbose):
-            print(' '.join(fsCmd))
-        if (not dryrun):
-            sp.check_call(fsCmd, stderr=devnull)
-        retVal = None
-    except sp.CalledProcessError as e:
-        if (failedOnce):
-            retVal = studentID
+    # The batched call failed: fs names the principal it rejected in its error
+    # output. If the student's ids aren't the problem, the defaults themselves
+    # are bad and there is nothing more to try.
+    if (studentID not in errOutput):
+        print("Unable to set default perms for {}: {}".format(path, errOutput.strip()))
+        return retVal
 
-    devnull.close()
+    # One of the student's principals is bad; re-apply the defaults alone,
+    # then try each student principal on its own. The student is only
+    # reported if BOTH of their principals fail.
+    fsCmd = ["fs", "sa", path, "-clear", "-acl"] + DEFAULT_PERMS
+    if (not _trySetAcl(fsCmd, dryrun, verbose)):
+        print("Unable to set default perms for {}".format(path))
+        return retVal
 
-    return retVal
+    okPlain = _trySetAcl(["fs", "sa", path, studentID, rights],
+                         dryrun, verbose)
+    okEmail = _trySetAcl(["fs", "sa", path, studentID + "@andrew.cmu.edu",
+                          rights], dryrun, verbose)
+    if (okPlain or okEmail):
+        return retVal
+    if (rights == "read"):
+        print("Error with trying to remove permissions for {}".format(path))
+    return studentID
+
+# Runs a single fs sa command, returning True if it succeeded
+def _trySetAcl(fsCmd, dryrun, verbose):
+    if (verbose):
+        print(' '.join(fsCmd))
+    if (dryrun):
+        return True
+    result = sp.run(fsCmd, stdin=sp.DEVNULL, stdout=sp.DEVNULL,
+                    stderr=sp.DEVNULL, close_fds=False)
+    return (result.returncode == 0)
 
 def printBadIDs(idList):
     print('\n{}Error:{} unable to set perms for'.format(bcolors.FAIL, bcolors.ENDC))
@@ -65,102 +97,96 @@ def printBadIDs(idList):
     print('Please check that ID is correct, and that student is in the ECE system.')
 
 # Creates a directory for each student inside of the basePath directory. ids
-# must be an array of student IDs.
+# must be an array of student IDs. Students are independent, so the work is
+# spread over a thread pool (each iteration just blocks on fs subprocesses).
 def createStudentDirs(basePath, ids, dryrun=False, verbose=False):
+    if (len(ids) == 0):
+        return
     badIDs = []
-    for student in ids:
-        path = basePath + '/' + student.lower()
-        if ((not dryrun) and (not os.path.exists(path))):
-            os.mkdir(basePath + '/' + student.lower())
-        elif (verbose):
-            print('\tHandin dir already exists for ' + student.lower() + ', skipping')
-        retVal = openStudentPerms(student, path, dryrun)
-        if (retVal != None):
-            badIDs.append(student)
-    if (len(badIDs) != 0):
-        printBadIDs(badIDs)
-
-# Sets AFS permissions such that the student may no longer write to the directory
-def closeStudentPerms(studentID, path, dryrun=False):
-    failedOnce = False
-    devnull = open(os.devnull, "w")
-    retVal = None
 
-    # Now change student perms
-    fsCmd = ["fs", "sa", path, studentID, "read"]
-    try:
+    def _one(student):
+        studentLC = student.lower()
+        path = os.path.join(basePath, studentLC)
+        if (verbose) and (os.path.exists(path)):
+            print('\tHandin dir already exists for ' + studentLC + ', skipping')
         if (not dryrun):
-            sp.check_call(fsCmd, stderr=devnull)
-        return retVal
-    except sp.CalledProcessError as e:
-        failedOnce = True
-
-    fsCmd = ["fs", "sa", path, studentID + "@andrew.cmu.edu", "read"]
-    try:
-        if (not dryrun):
-            sp.check_call(fsCmd, stderr=devnull)
-        retVal = None
-        return retVal
-    except sp.CalledProcessError as e:
-        if (failedOnce):
-            print("Error with trying to remove permissions for {}".format(path))
-            retVal = studentID
-            return retVal
-    finally:
-        devnull.close()
+            # One mkdir that swallows EEXIST, instead of an exists check
+            # plus mkdir with a race window between them
+            os.makedirs(path, exist_ok=True)
+        return (student, openStudentPerms(student, path, dryrun))
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(ids))) as pool:
+        for (student, retVal) in pool.map(_one, ids):
+            if (retVal != None):
+                badIDs.append(student)
+    if (len(badIDs) != 0):
+        printBadIDs(badIDs)
 
 def closeStudentDirs(basePath, dirs, dryrun=False):
+    if (len(dirs) == 0):
+        return
     badIDs = []
-    for studentDir in dirs:
-        path = basePath + "/" + studentDir
-        retVal = closeStudentPerms(studentDir, path, dryrun)
-        if (retVal != None):
-            badIDs.append(studentDir)
+
+    def _one(studentDir):
+        path = os.path.join(basePath, studentDir)
+        return (studentDir, closeStudentPerms(studentDir, path, dryrun))
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(dirs))) as pool:
+        for (studentDir, retVal) in pool.map(_one, dirs):
+            if (retVal != None):
+                badIDs.append(studentDir)
     if (len(badIDs) != 0):
         printBadIDs(badIDs)
 
 def checkStudent(studentDir, opArray, hwNum):
-    personalOutput = getOutputHeader(studentDir, hwNum)
+    studentID = os.path.basename(studentDir)
+    personalOutput = getOutputHeader(studentID, hwNum)
     hasAnyErrors = False
-    oldDir = os.getcwd()
-    os.chdir(studentDir)
 
-    print("\tChecking compile for {}".format(studentDir))
+    print("\tChecking compile for {}".format(studentID))
     for op in opArray:
-        op.clearErrors()
-        errString = op.do()
-        if (op.hasErrors):
+        result = op.run(cwd=studentDir)
+        if (result.hasErrors):
             hasAnyErrors = True
             personalOutput += writeHeaderLine("Problem {}".format(op.number), True)
-            personalOutput += errString
+            personalOutput += result.err + "\n"
     if (hasAnyErrors):
-        createErrLog(personalOutput)
-    # No errors, so should remove the log file
+        createErrLog(personalOutput, path=studentDir)
+    # No errors, so should remove the log file (and its hash sidecar)
     else:
-        if (os.path.exists('./errors.log')):
-            os.remove('./errors.log')
+        for name in ('errors.log', ERRLOG_SHA_NAME):
+            logPath = os.path.join(studentDir, name)
+            if (os.path.exists(logPath)):
+                os.remove(logPath)
 
-    os.chdir(oldDir)
     return (hasAnyErrors, personalOutput)
 
 def checkStudents(cfgDir, handinDir, studentList, hwNum):
+    # Directory contents may have changed since any earlier pass
+    clearDirCaches()
     # Parse config file and do relevant operations
     cfgPath = searchCfg(hwNum, cfgDir)
     # Take the proper (case-sensitive) hwNum
     hwNum = cfgPath[cfgPath.rindex("/")+1:cfgPath.index("_cfg.json")]
-    config = parseConfig(cfgDir + "/" + hwNum + "_cfg.json")
+    config = parseConfig(os.path.join(cfgDir, hwNum + "_cfg.json"))
     if (config == None):
         exit(255)
+    if (len(studentList) == 0):
+        return []
+    # Absolute so worker paths never depend on the process CWD
+    handinDir = os.path.abspath(handinDir)
+
+    # Ops don't mutate during run(), so one array is shared by all workers
     opArray = makeOpArray(config, silent=True)
-    oldCwd = os.getcwd()
-    os.chdir(handinDir)
+
+    def _one(student):
+        return checkStudent(os.path.join(handinDir, student), opArray, hwNum)
 
     errorStudents = []
-    for student in studentList:
-        hasErrors = False
-        (hasErrors, errOut) = checkStudent(student, opArray, hwNum)
-        if (hasErrors):
-            errorStudents.append(errOut)
-    os.chdir(oldCwd)
+    maxWorkers = min(MAX_WORKERS, len(studentList))
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        for (hasErrors, errOut) in pool.map(_one, studentList):
+            if (hasErrors):
+                errorStudents.append(errOut)
     return errorStudents
 
@@ -1,6 +1,11 @@
 from svinterface import checkInterface
 
+import atexit
 import configparser
+import functools
+import hashlib
+import re
+import threading
 import subprocess as sp
 import sys
 import os
@@ -9,8 +14,16 @@ import tempfile
 import glob
 import json
 import csv
+import fnmatch
 from pathlib import Path
 
+# orjson parses config files noticeably faster, but is optional; fall back
+# to the stdlib parser when it isn't installed
+try:
+    import orjson as _json
+except ImportError:
+    _json = json
+
 # Return values
 HANDIN_YES      = 0
 HANDIN_NO       = 1
@@ -27,6 +40,9 @@ ERR_HANDIN_DIR  = 210
 ERR_HANDIN_PERM = 211
 ERR_UNKNOWN     = 255
 
+# Matches any ANSI SGR escape sequence (color/bold/underline/reset)
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+
 # Colors!
 class bcolors:
     HEADER = '\033[95m'
@@ -52,19 +68,9 @@ class bcolors:
 
     @staticmethod
     def stripFormatting(s):
-        contents = s
-
-        # Remove formatting characters
-        contents = contents.replace(bcolors.HEADER, "")
-        contents = contents.replace(bcolors.OKBLUE, "")
-        contents = contents.replace(bcolors.OKGREEN, "")
-        contents = contents.replace(bcolors.WARNING, "")
-        contents = contents.replace(bcolors.FAIL, "")
-        contents = contents.replace(bcolors.ENDC, "")
-        contents = contents.replace(bcolors.BOLD, "")
-        contents = contents.replace(bcolors.UNDERLINE, "")
-
-        return contents
+        # Remove formatting characters. One regex pass instead of one
+        # full-string replace per code; also covers any codes added later
+        return _ANSI_RE.sub("", s)
 
 
 # We implement errors using exceptions
@@ -173,6 +179,95 @@ def parseCSVField(csvPath, field='Andrew ID'):
         studentList.append(row[field])
     return studentList
 
+@functools.lru_cache(maxsize=None)
+def _listdirCI(dirPath):
+    """Maps the lowercased names in dirPath to their on-disk names. Memoized
+    so repeated case-insensitive lookups only hit the filesystem once.
+    """
+    return {f.lower(): f for f in os.listdir(dirPath)}
+
+@functools.lru_cache(maxsize=None)
+def _scandirNames(dirPath):
+    """Memoized listing of the entry names in dirPath, so every wildcard
+    expanded against one directory shares a single read of it.
+    """
+    with os.scandir(dirPath) as entries:
+        return tuple(e.name for e in entries)
+
+@functools.lru_cache(maxsize=None)
+def _matchWildcard(pattern, dirPath):
+    """Expands a wildcard pattern against dirPath. Keyed on the directory so
+    results from one student's dir are never reused for another's. Flat
+    patterns are matched with fnmatch over the shared listing rather than
+    each re-reading the directory the way glob.glob would.
+    """
+    if (os.sep in pattern):
+        # Patterns reaching into subdirectories still go through glob
+        return tuple(glob.glob(pattern, root_dir=dirPath))
+    matches = fnmatch.filter(_scandirNames(dirPath), pattern)
+    # Match glob's behavior of hiding dotfiles from ordinary patterns
+    if (not pattern.startswith('.')):
+        matches = [m for m in matches if (not m.startswith('.'))]
+    return tuple(matches)
+
+@functools.lru_cache(maxsize=None)
+def _dirEntrySet(dirPath):
+    """Set of entry names in dirPath, for existence tests without a stat per
+    candidate. An unreadable/missing directory reads as empty.
+    """
+    try:
+        return frozenset(_scandirNames(dirPath))
+    except OSError:
+        return frozenset()
+
+def clearDirCaches():
+    """Drops the memoized directory listings/globs. Call before a fresh pass
+    over directories whose contents may have changed.
+    """
+    _listdirCI.cache_clear()
+    _scandirNames.cache_clear()
+    _matchWildcard.cache_clear()
+    _dirEntrySet.cache_clear()
+
+# vlogan work libraries, shared across every compile whose analyzed file set
+# is identical (same paths and mtimes). Each entry is (lock, workDir, state);
+# state records whether vlogan has run there and its error output if it
+# failed. The scratch dirs live until process exit.
+_workLibLock = threading.Lock()
+_workLibCache = {}
+
+def _getWorkLib(fileList):
+    key = []
+    for f in sorted(fileList):
+        try:
+            key.append((f, os.path.getmtime(f)))
+        except OSError:
+            key.append((f, None))
+    key = tuple(key)
+    with _workLibLock:
+        entry = _workLibCache.get(key)
+        if (entry == None):
+            entry = (threading.Lock(), tempfile.mkdtemp(),
+                     {'done': False, 'err': None})
+            _workLibCache[key] = entry
+    return entry
+
+@atexit.register
+def _cleanupWorkLibs():
+    for (entryLock, workDir, state) in _workLibCache.values():
+        shutil.rmtree(workDir, ignore_errors=True)
+
+@functools.lru_cache(maxsize=None)
+def _checkInterfaceCached(refFile, refMtime, testFile, testMtime, modules):
+    """Memoized wrapper for svinterface.checkInterface. svinterface doesn't
+    expose its parsed reference, so the whole comparison is cached instead,
+    keyed on both files' mtimes; repeat checks of an unchanged pair (e.g.
+    the same file listed by several problems) skip the re-parse entirely.
+    """
+    if (modules != None):
+        modules = list(modules)
+    return checkInterface(refFile, testFile, modules)
+
 def searchCfg(hwNum, cfgDir):
     """Case-insensitive search for a target config file in cfgDir.
 
@@ -184,12 +279,10 @@ def searchCfg(hwNum, cfgDir):
         (str): Path to the config file.
 
     """
-    fileName = hwNum + '_cfg.json'
-    fileList = os.listdir(cfgDir)
-    if (fileList != None):
-        for f in fileList:
-            if (f.lower() == fileName.lower()):
-                return '{}/{}'.format(cfgDir, f)
+    fileName = (hwNum + '_cfg.json').lower()
+    match = _listdirCI(cfgDir).get(fileName)
+    if (match != None):
+        return os.path.join(cfgDir, match)
     raise NoConfigError()
 
 def parseConfig(configPath):
@@ -210,23 +303,43 @@ def parseConfig(configPath):
     """
     if (not os.path.exists(configPath)):
         raise NoConfigError()
-    configFile = open(configPath, "r")
     try:
-        return json.load(configFile)
+        return _parseConfigCached(configPath, os.path.getmtime(configPath))
     except Exception as e:
         raise ParseConfigError(e)
-    finally:
-        configFile.close()
+
+@functools.lru_cache(maxsize=None)
+def _parseConfigCached(configPath, mtime):
+    # Keyed on mtime so an edited config is re-read, not served stale.
+    # Reading the raw bytes in one shot skips a TextIOWrapper layer
+    return _json.loads(Path(configPath).read_bytes())
 
 def checkJson(jsonPath):
-    jsonFile = open(jsonPath, 'r')
+    data = Path(jsonPath).read_bytes()
     try:
-        json.load(jsonFile)
+        _json.loads(data)
     except Exception as e:
         raise ParseConfigError(e)
 
+class OpResult:
+    """Outcome of a single run of an Operation's checks.
+
+    Attributes:
+        hasErrors (bool): True if there is an error with the problem, False
+            otherwise.
+        err (str): Output of error.
+
+    """
+    def __init__(self):
+        self.hasErrors = False
+        self.err = ""
+
 class Operation:
-    """Class that holds the necessary information for a problem's operations
+    """Class that holds the necessary information for a problem's operations.
+
+    The problem config itself is fixed once parsed; per-run outcomes live in
+    an OpResult (see run()), so one op may be run against many student dirs
+    concurrently.
 
     Attributes:
         number (int): Problem number
@@ -236,15 +349,16 @@ class Operation:
         specificModules ([str]): Name of modules to compile for.
         refFilePath (str): Path to where the SV reference files are. Used for
             SV module interface checking
-        hasErrors (bool): True if there is an error with the problem, False
+        hasErrors (bool): True if the most recent do() hit an error, False
             otherwise.
-        err (str): Output of error.
+        err (str): Error output of the most recent do().
         useWildcard (bool): True if the problem config uses the wildcard *.
         skipCompile (bool): True if we are to skip compilation.
         silent (bool): True if we don't want to print anything to console.
 
     """
-    def __init__(self, refFilePath=None, skipCompile=False, silent=False):
+    def __init__(self, refFilePath=None, skipCompile=False, silent=False,
+                 cwd=None):
         self.number = None
         self.existFiles = None
         self.compileFiles = None
@@ -256,6 +370,10 @@ class Operation:
         self.useWildcard = False
         self.skipCompile = skipCompile
         self.silent = silent
+        if (cwd != None):
+            self.cwd = os.path.abspath(cwd)
+        else:
+            self.cwd = os.getcwd()
 
     def clearErrors(self):
         self.hasErrors = False
@@ -280,8 +398,7 @@ class Operation:
                 if ("*" in f):
                 # Add all the wildcard files
                     self.useWildcard = True
-                    allFiles = set(glob.glob(f))
-                    tempExistFiles = tempExistFiles.union(allFiles)
+                    tempExistFiles.update(_matchWildcard(f, self.cwd))
                 else:
                     tempExistFiles.add(f)
             # Convert to a list, alphabetical order
@@ -289,8 +406,7 @@ class Operation:
         if (self.compileFiles != None):
             for f in self.compileFiles:
                 if ("*" in f):
-                    allFiles = set(glob.glob(f))
-                    tempCompileFiles = tempCompileFiles.union(allFiles)
+                    tempCompileFiles.update(_matchWildcard(f, self.cwd))
                 else:
                     tempCompileFiles.add(f)
             self.compileFiles = sorted(list(tempCompileFiles))
@@ -342,11 +458,13 @@ class Operation:
             errMessage = "unspecified error"
         return mainFile + ": " + bcolors.FAIL + errMessage + bcolors.ENDC
 
-    def checkExistence(self):
-        """Checks if every file in a file list exists within the current
+    def checkExistence(self, result, cwd):
+        """Checks if every file in a file list exists within the given
         directory. Also lists what files do not exist, if any.
 
         Args:
+            result (OpResult): Result to record errors on.
+            cwd (str): Directory to resolve relative file paths against.
 
         Returns:
 
@@ -356,11 +474,11 @@ class Operation:
             print("Files that will be handed in:")
         if (self.existFiles != None):
             for f in self.existFiles:
-                if (not os.path.exists("./" + f)):
-                    self.hasErrors = True
+                if (not os.path.exists(os.path.join(cwd, f))):
+                    result.hasErrors = True
                     error = self.getOpError(f, ERR_NOEXIST) + "\n"
                     badFileMsg += error
-                    self.err += error
+                    result.err += error
                 elif (not self.silent):
                     if (self.useWildcard):
                         print("\t{}".format(f))
@@ -376,11 +494,13 @@ class Operation:
     def removeOldDir(self, fileList, oldDir):
         return ", ".join(fileList).replace("{}/".format(oldDir), "")
 
-    def checkInterface(self):
+    def checkInterface(self, result, cwd):
         """Checks the module interfaces provided by files in the refFilePath
         folder, if they exist.
 
         Args:
+            result (OpResult): Result to record errors on.
+            cwd (str): Directory to resolve relative file paths against.
 
         Returns:
 
@@ -392,121 +512,194 @@ class Operation:
         if (self.existFiles != None):
             for f in self.existFiles:
                 fNoExt = Path(f).with_suffix('')
-                testFile = './{}'.format(f)
-                refFile = '{}/{}_ref.sv'.format(self.refFilePath, fNoExt)
-                # Ignore this check if the reference doesn't exist
-                if (not os.path.exists(refFile)):
+                testFile = os.path.join(cwd, f)
+                refName = '{}_ref.sv'.format(fNoExt)
+                refFile = os.path.join(self.refFilePath, refName)
+                # Ignore this check if the reference doesn't exist. One
+                # cached listing of the ref dir replaces a stat per student
+                # per file; nested names still need a real path check
+                if (os.sep in refName):
+                    if (not os.path.exists(refFile)):
+                        continue
+                elif (refName not in _dirEntrySet(self.refFilePath)):
                     continue
-                compareResult = checkInterface(refFile, testFile, self.specificModules)
+                if (self.specificModules != None):
+                    modules = tuple(self.specificModules)
+                else:
+                    modules = None
+                compareResult = _checkInterfaceCached(
+                        refFile, os.path.getmtime(refFile),
+                        testFile, os.path.getmtime(testFile), modules)
                 # A non-empty string implies there was an error
                 if (compareResult):
-                    self.hasErrors = True
+                    result.hasErrors = True
                     error = self.getOpError(f, ERR_BADINTERF) + '\n'
                     toPrint += error
-                    self.err += error + compareResult + '\n'
+                    result.err += error + compareResult + '\n'
                 else:
                     toPrint += f + ': interface matches reference, good'
         if (toPrint) and (not self.silent):
             print(toPrint.strip())
 
-    def compilationErrHandler(self, fileList, oldDir, err):
-        self.hasErrors = True
+    def compilationErrHandler(self, result, fileList, oldDir, errOutput):
+        result.hasErrors = True
         files = self.removeOldDir(fileList, oldDir)
         error = self.getOpError(files, ERR_NOCOMPILE) + "\n"
         if (not self.silent):
             print(error.strip())
-        self.err += error
+        result.err += error
         # Need to decode output from bytes to string properly
-        errOutput = err.output.decode('utf-8')
-        self.err += str(errOutput) + "\n"
+        result.err += errOutput.decode('utf-8') + "\n"
+
+    def runCompiler(self, cmd, cwd):
+        """Runs a single compiler invocation with its output streamed to a
+        temporary file rather than a pipe, so a failing compile with MBs of
+        output doesn't stall the child on a full pipe buffer.
+
+        Args:
+            cmd ([str]): Compiler command to run.
+            cwd (str): Scratch directory to run the compiler in.
+
+        Returns:
+            (bytes): Combined stdout/stderr on failure, None on success.
 
-    def checkCompilation(self):
+        """
+        with tempfile.TemporaryFile() as tf:
+            # A failing compile is an expected outcome, so branch on the
+            # returncode instead of paying for a raised CalledProcessError
+            result = sp.run(cmd, stdin=sp.DEVNULL, stdout=tf, stderr=sp.STDOUT,
+                            close_fds=False, cwd=cwd)
+            if (result.returncode != 0):
+                tf.seek(0)
+                return tf.read()
+        return None
+
+    def checkCompilation(self, result, cwd):
         """Tries to compile files from a list using VCS (or vLogan+VCS), and
         checks to see if any compilation errors arise.
 
         Args:
+            result (OpResult): Result to record errors on.
+            cwd (str): Directory to resolve relative file paths against.
 
         Returns:
 
         """
-        # Preserve old directory to return to
-        oldDir = os.getcwd()
         # Actual files are located in a different directory, so construct list:
+        srcDir = cwd
         fileList = []
         for fileName in self.compileFiles:
             # If the file path is absolute, then just append as is
             if (os.path.isabs(fileName)):
                 fileList.append(fileName)
-            # Otherwise need to prepend with old directory name
+            # Otherwise need to prepend with the source directory name
             else:
-                fileList.append("{}/{}".format(oldDir, fileName))
-        # Use tempfile's temporary directory creation. We must delete after done
-        tempDir = tempfile.mkdtemp()
-        os.chdir(tempDir)
-
-        try:
-            if (self.specificModules != None):
-                # Command to run vlogan with files
-                vloganCmd = ["vlogan", "-q", "-sverilog", "-nc"] + fileList
-                try:
-                    out = sp.check_output(vloganCmd, stderr=sp.STDOUT)
-                except sp.CalledProcessError as e:
-                    self.compilationErrHandler(fileList, oldDir, e)
+                fileList.append(os.path.join(srcDir, fileName))
+        if (self.specificModules != None):
+            # The vlogan work library only depends on the analyzed files, so
+            # students whose fileList matches (same paths and mtimes, e.g.
+            # shared reference testbenches) reuse one library and only pay
+            # for the per-module vcs runs. The entry lock also keeps two
+            # workers from clobbering each other's vcs output in the shared
+            # dir
+            (entryLock, workDir, state) = _getWorkLib(fileList)
+            with entryLock:
+                if (not state['done']):
+                    # Command to run vlogan with files
+                    vloganCmd = ["vlogan", "-q", "-sverilog", "-nc"] + fileList
+                    state['err'] = self.runCompiler(vloganCmd, workDir)
+                    state['done'] = True
+                if (state['err'] != None):
+                    self.compilationErrHandler(result, fileList, srcDir,
+                                               state['err'])
                     return
                 for module in self.specificModules:
                     vcsCmd = ["vcs", "-q", "-sverilog", "-nc", module]
-                    try:
-                        out = sp.check_output(vcsCmd, stderr=sp.STDOUT)
-                    except sp.CalledProcessError as e:
-                        self.compilationErrHandler(fileList, oldDir, e)
-            else:
+                    errOutput = self.runCompiler(vcsCmd, workDir)
+                    if (errOutput != None):
+                        self.compilationErrHandler(result, fileList, srcDir,
+                                                   errOutput)
+        else:
+            # Use tempfile's temporary directory creation. We must delete
+            # after done. The compiler runs with cwd=tempDir rather than
+            # chdir'ing the whole process, so concurrent checks don't
+            # trample each other.
+            tempDir = tempfile.mkdtemp()
+            try:
                 vcsCmd = ["vcs", "-q", "-sverilog", "-nc"] + fileList
-                try:
-                    out = sp.check_output(vcsCmd, stderr=sp.STDOUT)
-                except sp.CalledProcessError as e:
-                    self.compilationErrHandler(fileList, oldDir, e)
-            if (not self.silent) and (not self.hasErrors):
-                files = self.removeOldDir(fileList, oldDir)
-                print(files + ": file(s) compile, good")
-            return
-        except (KeyboardInterrupt):
-            raise
-        finally:
-            # Cleanup
-            os.chdir(oldDir)
-            shutil.rmtree(tempDir)
+                errOutput = self.runCompiler(vcsCmd, tempDir)
+                if (errOutput != None):
+                    self.compilationErrHandler(result, fileList, srcDir,
+                                               errOutput)
+            finally:
+                # Cleanup
+                shutil.rmtree(tempDir)
+        if (not self.silent) and (not result.hasErrors):
+            files = self.removeOldDir(fileList, srcDir)
+            print(files + ": file(s) compile, good")
 
     # TODO: checkTATB()
 
-    def do(self):
-        """Performs an operation based on the op's attributes.
+    def run(self, cwd=None):
+        """Performs the op's checks against a directory. The op itself is
+        left untouched, so a single op may run against many student dirs
+        (including concurrently).
 
         Args:
+            cwd (str): Optional; directory to resolve the op's relative paths
+                against (by default the CWD at op creation).
 
         Returns:
+            (OpResult): The outcome of this run's checks.
 
         """
+        if (cwd == None):
+            cwd = self.cwd
+        else:
+            cwd = os.path.abspath(cwd)
+        result = OpResult()
         if (self.existFiles != None):
-            self.checkExistence()
-            if (self.hasErrors):
-                return self.err + "\n"
+            self.checkExistence(result, cwd)
+            if (result.hasErrors):
+                return result
         if (self.refFilePath != None):
-            self.checkInterface()
-            if (self.hasErrors):
-                return self.err + "\n"
+            self.checkInterface(result, cwd)
+            if (result.hasErrors):
+                return result
         if ((not self.skipCompile) and (self.compileFiles != None)):
-            self.checkCompilation()
-            if (self.hasErrors):
-                return self.err + "\n"
+            self.checkCompilation(result, cwd)
+        return result
+
+    def do(self, cwd=None):
+        """Performs an operation based on the op's attributes, mirroring the
+        outcome onto hasErrors/err.
+
+        Args:
+            cwd (str): Optional; directory to resolve the op's relative paths
+                against (by default the CWD at op creation).
+
+        Returns:
+            (str): The run's error output (newline-terminated), or "" if the
+                run was clean.
+
+        """
+        result = self.run(cwd)
+        self.hasErrors = result.hasErrors
+        self.err = result.err
+        if (result.hasErrors):
+            return result.err + "\n"
         return ""
 
-def makeOpArray(config, refFilePath=None, skipCompile=False, silent=False):
+def makeOpArray(config, refFilePath=None, skipCompile=False, silent=False,
+                cwd=None):
     """Create an array of Operation objects from a config dict.
 
     Args:
         config (dict): Dict that represents the assignment's config
         skipCompile (bool): Optional; if True then skip compilation
         silent (bool): Optional; if True then don't print anything to console
+        cwd (str): Optional; directory the ops resolve relative paths (and
+            wildcards) against, instead of the process CWD
 
     Returns:
         ([Operation]): Array of problem ops.
@@ -516,7 +709,8 @@ def makeOpArray(config, refFilePath=None, skipCompile=False, silent=False):
     # Sort problem config array by problem number
     config = sorted(config, key=lambda p: p["number"])
     for problem in config:
-        op = Operation(refFilePath=refFilePath, skipCompile=skipCompile, silent=silent)
+        op = Operation(refFilePath=refFilePath, skipCompile=skipCompile,
+                       silent=silent, cwd=cwd)
         op.parseProblem(problem)
         opArray.append(op)
     return opArray
@@ -529,9 +723,9 @@ def doOpArray(opArray):
     for op in opArray:
         op.clearErrors()
         if (op.existFiles != None):
-            filesToSubmit = filesToSubmit.union(set(op.existFiles))
+            filesToSubmit.update(op.existFiles)
         if (op.compileFiles != None):
-            filesToSubmit = filesToSubmit.union(set(op.compileFiles))
+            filesToSubmit.update(op.compileFiles)
         errString = op.do()
         if (op.hasErrors):
             hasErrors = True
@@ -539,6 +733,12 @@ def doOpArray(opArray):
             errStringTotal += errString
     return (filesToSubmit, hasErrors, errStringTotal)
 
+# Header geometry for writeHeaderLine: 80 columns, -2 for the border "*"s.
+# The filler strings are built once so each call just slices them
+_HEADER_MAX_LEN = 78
+_FILL_SPACE = " " * _HEADER_MAX_LEN
+_FILL_STAR = "*" * _HEADER_MAX_LEN
+
 def writeHeaderLine(header, filled=False):
     """Used to write a line in the header for the errors.log file.
 
@@ -549,19 +749,12 @@ def writeHeaderLine(header, filled=False):
         (string): Formatted header line string.
 
     """
-    headerLen = 80
-    maxLen = headerLen - 2;         # -2 for beginning and ending "*"
     header = " " + header + " "
-    remaining = maxLen - len(header)
+    remaining = _HEADER_MAX_LEN - len(header)
     firstHalf = remaining // 2
     secondHalf = remaining - firstHalf
-    if (filled):
-        filler = "*"
-    else:
-        filler = " "
-    headerLine = "*" + (filler * firstHalf) + header + (filler * secondHalf) + \
-                 "*" + "\n"
-    return headerLine
+    filler = _FILL_STAR if (filled) else _FILL_SPACE
+    return f"*{filler[:firstHalf]}{header}{filler[:secondHalf]}*\n"
 
 def getOutputHeader(studentID, hwNum):
     """Writes a formatted header that details hwNum and Andrew ID.
@@ -580,8 +773,14 @@ def getOutputHeader(studentID, hwNum):
     outputHeader += headerLine
     return outputHeader
 
+# Sidecar holding a hash of the last-written errors.log, so re-runs can skip
+# rewriting unchanged logs (writes over AFS are slow, hashing is not)
+ERRLOG_SHA_NAME = ".errors.log.sha"
+
 def createErrLog(contents, path="."):
-    """Writes an errors.log file with the formatting characters removed.
+    """Writes an errors.log file with the formatting characters removed. The
+    write is skipped when the contents match what was written last time, as
+    recorded by a hash sidecar next to the log.
 
     Args:
         contents (str): The stuff to write to the log file.
@@ -591,13 +790,26 @@ def createErrLog(contents, path="."):
         Nothing.
 
     """
-    fd = open(path + "/errors.log", "w")
+    logPath = os.path.join(path, "errors.log")
+    shaPath = os.path.join(path, ERRLOG_SHA_NAME)
     toWrite = bcolors.stripFormatting(contents)
+    digest = hashlib.blake2b(toWrite.encode('utf-8'),
+                             digest_size=16).hexdigest()
+    try:
+        if (os.path.exists(logPath)) and \
+           (Path(shaPath).read_text() == digest):
+            return
+    except OSError:
+        pass
+    fd = open(logPath, "w")
     fd.write(toWrite)
     fd.close()
+    fd = open(shaPath, "w")
+    fd.write(digest)
+    fd.close()
 
 def writeResults(strArr, hwNum, resultsDir):
-    path = "{}/{}_results.txt".format(resultsDir, hwNum)
+    path = os.path.join(resultsDir, "{}_results.txt".format(hwNum))
     if (len(strArr) < 1):
         return
     fd = open(path, "w")
@@ -620,7 +832,8 @@ def checkFs(studentID, studentDir):
 
     """
     fsCmd = ["fs", "la", studentDir]
-    perms = sp.check_output(fsCmd).decode('utf-8').split('\n')
+    perms = sp.check_output(fsCmd, stdin=sp.DEVNULL,
+                            close_fds=False).decode('utf-8').split('\n')
     try:
         selfPerm = ''
         for perm in perms:
@@ -635,3 +848,44 @@ def checkFs(studentID, studentDir):
     # Has write permissions
     return "rlidwk" in selfPerm
 
+def checkFsMulti(studentPairs):
+    """Checks AFS permissions for many students with a single fs invocation.
+    fs la accepts multiple paths per call, so N students cost one fork+exec
+    and one AFS round trip instead of N.
+
+    Args:
+        studentPairs ([(str, str)]): (studentID, studentDir) pairs to check.
+
+    Returns:
+        (dict): Maps each studentID to True if that student has write
+            permissions on their dir, False otherwise (including if the
+            student directory does not exist).
+
+    """
+    results = {}
+    dirToID = {}
+    for (studentID, studentDir) in studentPairs:
+        results[studentID] = False
+        dirToID[studentDir] = studentID
+    if (len(results) == 0):
+        return results
+
+    fsCmd = ["fs", "la"] + [studentDir for (_, studentDir) in studentPairs]
+    out = sp.run(fsCmd, stdin=sp.DEVNULL, stdout=sp.PIPE, stderr=sp.DEVNULL,
+                 close_fds=False).stdout.decode('utf-8')
+    # fs prints one "Access list for <dir> is" section per dir that it could
+    # read; dirs it errored on simply have no section and stay False
+    for section in out.split("Access list for ")[1:]:
+        (header, _, body) = section.partition(" is\n")
+        studentID = dirToID.get(header)
+        if (studentID == None):
+            continue
+        selfPerm = ''
+        for perm in body.split('\n'):
+            if perm.strip().startswith(studentID):
+                selfPerm = perm.strip()
+                break
+        # Has write permissions
+        results[studentID] = "rlidwk" in selfPerm
+    return results
+